@@ -0,0 +1,46 @@
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from personal_assistant import FinanceRecord, PartitionedFinanceManager
+
+MONTHS = 48
+RECORDS_PER_MONTH = 20000
+
+
+def build_ledger(directory):
+    manager = PartitionedFinanceManager(directory=directory, legacy_filename=os.path.join(directory, 'finance.json'))
+    start = datetime(2015, 1, 1)
+    record_id = 1
+    for month in range(MONTHS):
+        first_day = (start + timedelta(days=31 * month)).replace(day=1)
+        records = []
+        for _ in range(RECORDS_PER_MONTH):
+            date = first_day.replace(day=random.randint(1, 28)).strftime("%d-%m-%Y")
+            records.append(FinanceRecord(record_id, round(random.uniform(-500, 500), 2), "Прочее", date))
+            record_id += 1
+        manager.add_records(records)
+        manager.partitions.clear()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        build_ledger(directory)
+        print(f"Разделов: {MONTHS}, записей: {MONTHS * RECORDS_PER_MONTH}")
+
+        for workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+            # Новый менеджер на каждый прогон, чтобы разделы не были уже загружены в память.
+            manager = PartitionedFinanceManager(directory=directory, max_workers=workers)
+            started = time.perf_counter()
+            income, expense = manager.report_totals()
+            elapsed = time.perf_counter() - started
+            print(f"Процессов: {workers:>2} | {elapsed:.3f} с | Баланс: {income - expense:.2f}")
+
+
+if __name__ == "__main__":
+    main()
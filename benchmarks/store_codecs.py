@@ -0,0 +1,49 @@
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from personal_assistant import JsonCodec, Task, available_codecs, load_store, save_store
+
+TASKS = 200000
+
+
+def measure(filename, save, load):
+    started = time.perf_counter()
+    save()
+    saved = time.perf_counter() - started
+    started = time.perf_counter()
+    load()
+    loaded = time.perf_counter() - started
+    return saved, loaded, os.path.getsize(filename)
+
+
+def main():
+    items = [Task(i, f"Задача {i}", "Описание задачи", i % 2 == 0, "Средний", "01-01-2027").to_dict()
+             for i in range(TASKS)]
+    print(f"Записей: {TASKS}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'store')
+
+        def save_pretty():
+            # Прежний формат хранилищ: json.dump с отступами.
+            with open(filename, 'w', encoding='utf-8') as file:
+                json.dump(items, file, ensure_ascii=False, indent=4)
+
+        # Каждый формат читается своим кодеком, иначе при установленном orjson все текстовые файлы читал бы он.
+        results = [("json indent=4", measure(filename, save_pretty, lambda: load_store(filename, JsonCodec())))]
+        for codec in available_codecs():
+            results.append((codec.name, measure(filename, lambda: save_store(filename, items, codec),
+                                                 lambda: load_store(filename, codec))))
+
+        for name, (saved, loaded, size) in results:
+            print(f"{name:>14} | запись: {TASKS / saved:>10.0f} зап/с | чтение: {TASKS / loaded:>10.0f} зап/с | "
+                  f"размер: {size / 1024 / 1024:.1f} МБ")
+
+
+if __name__ == "__main__":
+    main()
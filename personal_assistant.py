@@ -1,5 +1,125 @@
+import copy
+import heapq
 import json
-from datetime import datetime
+import operator
+import os
+import re
+import sys
+import threading
+import uuid
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Минимальное число разделов журнала, начиная с которого отчет считается в нескольких процессах.
+PARALLEL_REPORT_MIN_PARTITIONS = 8
+
+# Версия формата файлов хранилищ. Версия 1 - просто список записей с отступами, как раньше.
+STORE_FORMAT_VERSION = 2
+MSGPACK_MAGIC = b'PAMP'
+
+
+class JsonCodec:
+    name = 'json'
+
+    def dumps(self, obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    name = 'orjson'
+
+    def dumps(self, obj):
+        return orjson.dumps(obj)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+class MsgpackCodec:
+    name = 'msgpack'
+
+    def dumps(self, obj):
+        return MSGPACK_MAGIC + msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, data):
+        return msgpack.unpackb(data[len(MSGPACK_MAGIC):], raw=False)
+
+
+def available_codecs():
+    codecs = [JsonCodec()]
+    if orjson:
+        codecs.append(OrjsonCodec())
+    if msgpack:
+        codecs.append(MsgpackCodec())
+    return codecs
+
+
+def default_codec():
+    # orjson выбирается первым, даже если установлен msgpack: файл остается читаемым текстовым JSON.
+    if orjson:
+        return OrjsonCodec()
+    if msgpack:
+        return MsgpackCodec()
+    return JsonCodec()
+
+
+def dumps_line(obj):
+    if orjson:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def loads_line(line):
+    return orjson.loads(line) if orjson else json.loads(line)
+
+
+def save_store(filename, items, codec=None):
+    codec = codec or default_codec()
+    data = codec.dumps({"format": STORE_FORMAT_VERSION, "codec": codec.name, "items": items})
+    # Пишем во временный файл, чтобы сбой не оставил хранилище наполовину записанным.
+    with open(filename + '.tmp', 'wb') as file:
+        file.write(data)
+    os.replace(filename + '.tmp', filename)
+
+
+def load_store(filename, codec=None):
+    with open(filename, 'rb') as file:
+        data = file.read()
+
+    if data.startswith(MSGPACK_MAGIC):
+        if not msgpack:
+            raise RuntimeError(f"Файл {filename} сохранен в формате msgpack, установите пакет msgpack.")
+        stored = MsgpackCodec().loads(data)
+    elif codec:
+        # Текстовый файл можно прочитать заданным кодеком, например чтобы сравнить json и orjson.
+        stored = codec.loads(data)
+    else:
+        stored = loads_line(data)
+
+    # Файлы версии 1 (и экспорт) - это просто список записей. Объект без items возвращается как None,
+    # его, как и любой не список, отвергнет проверка схемы.
+    if not isinstance(stored, dict):
+        return stored
+    if stored.get("format", 0) > STORE_FORMAT_VERSION:
+        raise RuntimeError(f"Файл {filename} сохранен более новой версией программы.")
+    return stored.get("items")
 
 class Note:
     def __init__(self, id, title, content, timestamp=None):
@@ -20,27 +140,54 @@ class Note:
         }
 
 class TaskManager:
-    def __init__(self, filename='tasks.json'):
+    def __init__(self, filename='tasks.json', scheduler=None, journal=None, codec=None, history=None):
         self.filename = filename
+        self.scheduler = scheduler
+        self.journal = journal
+        self.history = history
+        self.codec = codec
+        self.indexes = {}
         self.tasks = self.load_tasks()
+        if self.scheduler:
+            self.scheduler.load(self.tasks)
+        if self.journal:
+            self.journal.bootstrap(self.tasks)
+
+    def _record_changes(self, changes, sources=None):
+        if changes:
+            self.indexes.clear()
+        if self.scheduler:
+            for op, task, before in changes:
+                if op == 'delete':
+                    self.scheduler.unschedule(task.id)
+                elif (op == 'update' and before.due_date_ordinal == task.due_date_ordinal
+                      and before.done == task.done):
+                    # Срок не менялся - напоминание не переставляем, иначе оно сработало бы повторно.
+                    self.scheduler.refresh(task)
+                else:
+                    self.scheduler.schedule(task)
+        if self.journal:
+            self.journal.append(changes, sources)
+        if self.history:
+            self.history.record(changes)
 
     def load_tasks(self):
         try:
-            with open(self.filename, 'r', encoding='utf-8') as file:
-                tasks_data = json.load(file)
-                return [Task(**task) for task in tasks_data]
+            tasks_data = load_store(self.filename)
+            return TASK_SCHEMA.validate(tasks_data, self.filename)
         except FileNotFoundError:
             return []
 
     def save_tasks(self):
-        with open(self.filename, 'w', encoding='utf-8') as file:
-            json.dump([task.to_dict() for task in self.tasks], file, ensure_ascii=False, indent=4)
+        save_store(self.filename, [task.to_dict() for task in self.tasks], self.codec)
 
     def add_task(self, title, description='', priority='Низкий', due_date=None):
-        task_id = len(self.tasks) + 1
+        # Максимальный id + 1, а не длина списка: после удаления id не должен повториться.
+        task_id = max((t.id for t in self.tasks), default=0) + 1
         new_task = Task(task_id, title, description, False, priority, due_date)
         self.tasks.append(new_task)
         self.save_tasks()
+        self._record_changes([('insert', new_task, None)])
         print("Задача успешно добавлена!")
 
     def view_tasks(self):
@@ -54,8 +201,10 @@ class TaskManager:
     def mark_task_done(self, task_id):
         task = next((t for t in self.tasks if t.id == task_id), None)
         if task:
+            before = copy.copy(task)
             task.done = True
             self.save_tasks()
+            self._record_changes([('update', task, before)])
             print("Задача отмечена как выполненная!")
         else:
             print("Задача не найдена.")
@@ -63,6 +212,7 @@ class TaskManager:
     def edit_task(self, task_id, title=None, description=None, priority=None, due_date=None):
         task = next((t for t in self.tasks if t.id == task_id), None)
         if task:
+            before = copy.copy(task)
             if title is not None:
                 task.title = title
             if description is not None:
@@ -71,7 +221,9 @@ class TaskManager:
                 task.priority = priority
             if due_date is not None:
                 task.due_date = due_date
+                task.due_date_ordinal = _date_ordinal_or_none(due_date)
             self.save_tasks()
+            self._record_changes([('update', task, before)])
             print("Задача успешно отредактирована!")
         else:
             print("Задача не найдена.")
@@ -79,29 +231,50 @@ class TaskManager:
     def delete_task(self, task_id):
         task = next((t for t in self.tasks if t.id == task_id), None)
         if task:
-            self.tasks.remove(task)
+            position = self.tasks.index(task)
+            del self.tasks[position]
             self.save_tasks()
+            self._record_changes([('delete', task, position)])
             print("Задача успешно удалена!")
         else:
             print("Задача не найдена.")
 
     def import_tasks(self, import_file):
         try:
-            with open(import_file, 'r', encoding='utf-8') as file:
-                imported_tasks = json.load(file)
-                for imported_task in imported_tasks:
-                    new_task = Task(**imported_task)
-                    self.tasks.append(new_task)
-                self.save_tasks()
-                print("Задачи успешно импортированы!")
+            imported_tasks = load_store(import_file)
+            new_tasks = TASK_SCHEMA.validate(imported_tasks, import_file)
+            _assign_free_ids(new_tasks, (task.id for task in self.tasks))
+            self.tasks.extend(new_tasks)
+            self.save_tasks()
+            self._record_changes([('insert', task, None) for task in new_tasks])
+            print("Задачи успешно импортированы!")
         except FileNotFoundError:
             print("Файл для импорта не найден.")
+        except SchemaError as e:
+            print(f"Импорт отменен.\n{e}")
 
     def export_tasks(self, export_file):
         with open(export_file, 'w', encoding='utf-8') as file:
             json.dump([task.to_dict() for task in self.tasks], file, ensure_ascii=False, indent=4)
         print("Задачи успешно экспортированы!")
 
+    def export_changes(self, export_file, since=0):
+        _export_changes(self.journal, export_file, since)
+
+    def apply_changes(self, import_file):
+        delta = _read_delta(self.journal, import_file, TASK_SCHEMA, lambda ids: _lookup_ids(self.tasks, ids))
+        if delta is None:
+            return
+        applied = self.apply_batch(delta["changes"])
+        _finish_changes(self.journal, delta, applied)
+
+    def apply_batch(self, changes):
+        applied, sources = _apply_changes(self.tasks, changes)
+        if applied:
+            self.save_tasks()
+            self._record_changes(applied, sources)
+        return applied
+
     def filter_tasks(self, status=None, priority=None):
         filtered_tasks = [task for task in self.tasks if
                           (status is None or task.done == status) and (priority is None or task.priority == priority)]
@@ -115,6 +288,17 @@ class TaskManager:
             print(
                 f"{task.id}: {task.title} | Статус: {status_str} | Приоритет: {task.priority} | Срок: {task.due_date}")
 
+    def view_upcoming(self, limit=10):
+        if not self.scheduler:
+            print("Напоминания не включены.")
+            return
+        upcoming = self.scheduler.upcoming(limit)
+        if not upcoming:
+            print("Нет задач с предстоящими сроками.")
+            return
+        for task in upcoming:
+            print(f"{task.id}: {task.title} | Приоритет: {task.priority} | Срок: {task.due_date}")
+
 class Task:
     def __init__(self, id, title, description='', done=False, priority='Низкий', due_date=None):
         self.id = id
@@ -123,6 +307,7 @@ class Task:
         self.done = done
         self.priority = priority
         self.due_date = due_date if due_date else datetime.now().strftime("%d-%m-%Y")
+        self.due_date_ordinal = _date_ordinal_or_none(self.due_date)
 
     def to_dict(self):
         return {
@@ -134,28 +319,158 @@ class Task:
             "due_date": self.due_date
         }
 
+def notify_console(task, state):
+    if state == 'due':
+        print(f"\nНапоминание: сегодня срок задачи {task.id}: {task.title}")
+    else:
+        print(f"\nНапоминание: задача {task.id}: {task.title} просрочена (срок {task.due_date})")
+
+class ReminderScheduler:
+    """Напоминания о сроках невыполненных задач.
+
+    Задачи лежат в куче по дате срока, поэтому такт проверки смотрит только на вершину кучи.
+    Записи изменённых и удалённых задач не ищутся в куче, а помечаются устаревшими через версию
+    и отбрасываются при извлечении. callback(task, state) вызывается со state 'due' в день срока
+    и 'overdue' после него.
+    """
+
+    def __init__(self, callback=notify_console, interval=60):
+        self.callback = callback
+        self.interval = interval
+        self._heap = []
+        self._entries = {}
+        self._version = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _make_entry(self, task):
+        self._entries.pop(task.id, None)
+        if task.done:
+            return None
+        due_ordinal = task.due_date_ordinal
+        if due_ordinal is None:
+            return None
+        self._version += 1
+        self._entries[task.id] = (task, self._version)
+        # (день срабатывания, id, версия, день срока)
+        return due_ordinal, task.id, self._version, due_ordinal
+
+    def load(self, tasks):
+        with self._lock:
+            self._entries = {}
+            heap = [entry for entry in map(self._make_entry, tasks) if entry]
+            heapq.heapify(heap)
+            self._heap = heap
+
+    def schedule(self, task):
+        with self._lock:
+            entry = self._make_entry(task)
+            if entry:
+                heapq.heappush(self._heap, entry)
+            self._compact()
+
+    def refresh(self, task):
+        # Подменяет объект задачи (например, после применения изменений), сохраняя версию записи в куче.
+        with self._lock:
+            if task.id in self._entries:
+                self._entries[task.id] = (task, self._entries[task.id][1])
+
+    def unschedule(self, task_id):
+        with self._lock:
+            self._entries.pop(task_id, None)
+            self._compact()
+
+    def _is_live(self, entry):
+        current = self._entries.get(entry[1])
+        return current is not None and current[1] == entry[2]
+
+    def _compact(self):
+        # Перестраиваем кучу, только когда устаревших записей стало больше, чем актуальных.
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [entry for entry in self._heap if self._is_live(entry)]
+            heapq.heapify(self._heap)
+
+    def check(self, today=None):
+        today = today if today is not None else date.today().toordinal()
+        fired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= today:
+                entry = heapq.heappop(self._heap)
+                if not self._is_live(entry):
+                    continue
+                _, task_id, version, due_ordinal = entry
+                task = self._entries[task_id][0]
+                if due_ordinal == today:
+                    fired.append((task, 'due'))
+                    heapq.heappush(self._heap, (today + 1, task_id, version, due_ordinal))
+                else:
+                    fired.append((task, 'overdue'))
+                    del self._entries[task_id]
+
+        for task, state in fired:
+            self.callback(task, state)
+        return fired
+
+    def upcoming(self, limit=10):
+        with self._lock:
+            live = [entry for entry in self._heap if self._is_live(entry)]
+            return [self._entries[entry[1]][0] for entry in heapq.nsmallest(limit, live, key=lambda e: e[3])]
+
+    def _run(self):
+        while True:
+            self.check()
+            if self._stop.wait(self.interval):
+                break
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='reminders', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
 class NoteManager:
-    def __init__(self, filename='notes.json'):
+    def __init__(self, filename='notes.json', journal=None, codec=None, history=None):
         self.filename = filename
+        self.journal = journal
+        self.history = history
+        self.codec = codec
+        self.indexes = {}
         self.notes = self.load_notes()
+        if self.journal:
+            self.journal.bootstrap(self.notes)
+
+    def _record_changes(self, changes, sources=None):
+        if changes:
+            self.indexes.clear()
+        if self.journal:
+            self.journal.append(changes, sources)
+        if self.history:
+            self.history.record(changes)
 
     def load_notes(self):
         try:
-            with open(self.filename, 'r', encoding='utf-8') as file:
-                notes_data = json.load(file)
-                return [Note(**note) for note in notes_data]
+            notes_data = load_store(self.filename)
+            return NOTE_SCHEMA.validate(notes_data, self.filename)
         except FileNotFoundError:
             return []
 
     def save_notes(self):
-        with open(self.filename, 'w', encoding='utf-8') as file:
-            json.dump([note.to_dict() for note in self.notes], file, ensure_ascii=False, indent=4)
+        save_store(self.filename, [note.to_dict() for note in self.notes], self.codec)
 
     def create_note(self, title, content):
-        note_id = len(self.notes) + 1
+        note_id = max((n.id for n in self.notes), default=0) + 1
         new_note = Note(note_id, title, content)
         self.notes.append(new_note)
         self.save_notes()
+        self._record_changes([('insert', new_note, None)])
         print("Заметка успешно создана!")
 
     def view_notes(self):
@@ -176,12 +491,14 @@ class NoteManager:
 
         note = next((n for n in self.notes if n.id == note_id), None)
         if note:
+            before = copy.copy(note)
             if title is not None:
                 note.title = title
             if content is not None:
                 note.content = content
             note.timestamp = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
             self.save_notes()
+            self._record_changes([('update', note, before)])
             print("Заметка успешно отредактирована!")
         else:
             print("Заметка не найдена.")
@@ -189,29 +506,50 @@ class NoteManager:
     def delete_note(self, note_id):
         note = next((n for n in self.notes if n.id == note_id), None)
         if note:
-            self.notes.remove(note)
+            position = self.notes.index(note)
+            del self.notes[position]
             self.save_notes()
+            self._record_changes([('delete', note, position)])
             print("Заметка успешно удалена!")
         else:
             print("Заметка не найдена.")
 
     def import_notes(self, import_file):
         try:
-            with open(import_file, 'r', encoding='utf-8') as file:
-                imported_notes = json.load(file)
-                for imported_note in imported_notes:
-                    new_note = Note(**imported_note)
-                    self.notes.append(new_note)
-                self.save_notes()
-                print("Заметки успешно импортированы!")
+            imported_notes = load_store(import_file)
+            new_notes = NOTE_SCHEMA.validate(imported_notes, import_file)
+            _assign_free_ids(new_notes, (note.id for note in self.notes))
+            self.notes.extend(new_notes)
+            self.save_notes()
+            self._record_changes([('insert', note, None) for note in new_notes])
+            print("Заметки успешно импортированы!")
         except FileNotFoundError:
             print("Файл для импорта не найден.")
+        except SchemaError as e:
+            print(f"Импорт отменен.\n{e}")
 
     def export_notes(self, export_file):
         with open(export_file, 'w', encoding='utf-8') as file:
             json.dump([note.to_dict() for note in self.notes], file, ensure_ascii=False, indent=4)
         print("Заметки успешно экспортированы!")
 
+    def export_changes(self, export_file, since=0):
+        _export_changes(self.journal, export_file, since)
+
+    def apply_changes(self, import_file):
+        delta = _read_delta(self.journal, import_file, NOTE_SCHEMA, lambda ids: _lookup_ids(self.notes, ids))
+        if delta is None:
+            return
+        applied = self.apply_batch(delta["changes"])
+        _finish_changes(self.journal, delta, applied)
+
+    def apply_batch(self, changes):
+        applied, sources = _apply_changes(self.notes, changes)
+        if applied:
+            self.save_notes()
+            self._record_changes(applied, sources)
+        return applied
+
 class Contact:
     def __init__(self, id, name, phone='', email=''):
         self.id = id
@@ -228,27 +566,40 @@ class Contact:
         }
 
 class ContactManager:
-    def __init__(self, filename='contacts.json'):
+    def __init__(self, filename='contacts.json', journal=None, codec=None, history=None):
         self.filename = filename
+        self.journal = journal
+        self.history = history
+        self.codec = codec
+        self.indexes = {}
         self.contacts = self.load_contacts()
+        if self.journal:
+            self.journal.bootstrap(self.contacts)
+
+    def _record_changes(self, changes, sources=None):
+        if changes:
+            self.indexes.clear()
+        if self.journal:
+            self.journal.append(changes, sources)
+        if self.history:
+            self.history.record(changes)
 
     def load_contacts(self):
         try:
-            with open(self.filename, 'r', encoding='utf-8') as file:
-                contacts_data = json.load(file)
-                return [Contact(**contact) for contact in contacts_data]
+            contacts_data = load_store(self.filename)
+            return CONTACT_SCHEMA.validate(contacts_data, self.filename)
         except FileNotFoundError:
             return []
 
     def save_contacts(self):
-        with open(self.filename, 'w', encoding='utf-8') as file:
-            json.dump([contact.to_dict() for contact in self.contacts], file, ensure_ascii=False, indent=4)
+        save_store(self.filename, [contact.to_dict() for contact in self.contacts], self.codec)
 
     def add_contact(self, name, phone='', email=''):
-        contact_id = len(self.contacts) + 1
+        contact_id = max((c.id for c in self.contacts), default=0) + 1
         new_contact = Contact(contact_id, name, phone, email)
         self.contacts.append(new_contact)
         self.save_contacts()
+        self._record_changes([('insert', new_contact, None)])
         print("Контакт успешно добавлен!")
 
     def search_contact(self, search_term):
@@ -266,6 +617,7 @@ class ContactManager:
         contact = next((c for c in self.contacts if c.id == contact_id), None)
 
         if contact:
+            before = copy.copy(contact)
             if name is not None:
                 contact.name = name
             if phone is not None:
@@ -274,6 +626,7 @@ class ContactManager:
                 contact.email = email
 
             self.save_contacts()
+            self._record_changes([('update', contact, before)])
             print("Контакт успешно отредактирован!")
         else:
             print("Контакт не найден.")
@@ -282,35 +635,58 @@ class ContactManager:
         contact = next((c for c in self.contacts if c.id == contact_id), None)
 
         if contact:
-            self.contacts.remove(contact)
+            position = self.contacts.index(contact)
+            del self.contacts[position]
             self.save_contacts()
+            self._record_changes([('delete', contact, position)])
             print("Контакт успешно удален!")
         else:
             print("Контакт не найден.")
 
     def import_contacts(self, import_file):
         try:
-            with open(import_file, 'r', encoding='utf-8') as file:
-                imported_contacts = json.load(file)
-                for imported_contact in imported_contacts:
-                    new_contact = Contact(**imported_contact)
-                    self.contacts.append(new_contact)
-                self.save_contacts()
-                print("Контакты успешно импортированы!")
+            imported_contacts = load_store(import_file)
+            new_contacts = CONTACT_SCHEMA.validate(imported_contacts, import_file)
+            _assign_free_ids(new_contacts, (contact.id for contact in self.contacts))
+            self.contacts.extend(new_contacts)
+            self.save_contacts()
+            self._record_changes([('insert', contact, None) for contact in new_contacts])
+            print("Контакты успешно импортированы!")
         except FileNotFoundError:
             print("Файл для импорта не найден.")
+        except SchemaError as e:
+            print(f"Импорт отменен.\n{e}")
 
     def export_contacts(self, export_file):
         with open(export_file, 'w', encoding='utf-8') as file:
             json.dump([contact.to_dict() for contact in self.contacts], file, ensure_ascii=False, indent=4)
         print("Контакты успешно экспортированы!")
 
+    def export_changes(self, export_file, since=0):
+        _export_changes(self.journal, export_file, since)
+
+    def apply_changes(self, import_file):
+        delta = _read_delta(self.journal, import_file, CONTACT_SCHEMA, lambda ids: _lookup_ids(self.contacts, ids))
+        if delta is None:
+            return
+        applied = self.apply_batch(delta["changes"])
+        _finish_changes(self.journal, delta, applied)
+
+    def apply_batch(self, changes):
+        applied, sources = _apply_changes(self.contacts, changes)
+        if applied:
+            self.save_contacts()
+            self._record_changes(applied, sources)
+        return applied
+
 class FinanceRecord:
     def __init__(self, id, amount, category, date, description=''):
         self.id = id
-        self.amount = amount
+        self.amount_minor = _to_minor(amount)
+        self.amount = self.amount_minor / 100
         self.category = category
         self.date = date
+        self.date_ordinal = _date_ordinal(date)
         self.description = description
 
     def to_dict(self):
@@ -322,28 +698,224 @@ class FinanceRecord:
             "description": self.description
         }
 
+class SchemaError(ValueError):
+    def __init__(self, source, errors):
+        self.source = source
+        self.errors = errors
+        lines = [f"{source}: записей с ошибками: {len(errors)}"]
+        lines += [f"  запись #{position}: {message}" for position, message in errors[:20]]
+        if len(errors) > 20:
+            lines.append(f"  ... и еще {len(errors) - 20}")
+        super().__init__("\n".join(lines))
+
+
+# Значение по умолчанию для обязательных полей схемы.
+REQUIRED = object()
+
+_DATE_FORMAT = re.compile(r"\d{2}-\d{2}-\d{4}")
+
+
+def _to_minor(amount):
+    if isinstance(amount, bool) or not isinstance(amount, (int, float, str)):
+        raise ValueError(f"неверная сумма: {amount!r}")
+    try:
+        # str() у float дает кратчайшее точное представление, так что 0.1 становится ровно 10 копейками.
+        minor = Decimal(str(amount)).scaleb(2).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        raise ValueError(f"неверная сумма: {amount!r}") from None
+    if not minor.is_finite():
+        raise ValueError(f"неверная сумма: {amount!r}")
+    return int(minor)
+
+
+def _convert_text(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise ValueError(f"ожидалась строка, получено {value!r}")
+
+
+def _convert_date(value):
+    if not isinstance(value, str):
+        raise ValueError(f"неверная дата: {value!r}")
+    if not _DATE_FORMAT.fullmatch(value):
+        # Приводим даты вроде 1-2-2024 к формату ДД-ММ-ГГГГ.
+        try:
+            value = datetime.strptime(value, "%d-%m-%Y").strftime("%d-%m-%Y")
+        except ValueError:
+            raise ValueError(f"неверная дата: {value!r}, ожидается ДД-ММ-ГГГГ") from None
+    try:
+        return value, _date_ordinal(value)
+    except ValueError:
+        raise ValueError(f"неверная дата: {value!r}") from None
+
+
+# Установщики полей: проверяют и приводят значение и кладут его (и производные поля) в словарь записи.
+# Частый случай - значение уже нужного типа - проверяется первым и без лишних вызовов.
+
+def _set_id(values, name, value):
+    if type(value) is int:
+        values[name] = value
+    elif type(value) is str and value.isdigit():
+        values[name] = int(value)
+    else:
+        raise ValueError(f"неверный id: {value!r}")
+
+
+def _set_text(values, name, value):
+    values[name] = value if type(value) is str else _convert_text(value)
+
+
+def _set_interned(values, name, value):
+    values[name] = sys.intern(value if type(value) is str else _convert_text(value))
+
+
+def _set_bool(values, name, value):
+    if type(value) is not bool:
+        raise ValueError(f"ожидалось true/false, получено {value!r}")
+    values[name] = value
+
+
+def _set_date(values, name, value):
+    values[name], values[name + '_ordinal'] = _convert_date(value)
+
+
+def _set_money(values, name, value):
+    values[name + '_minor'] = minor = _to_minor(value)
+    values[name] = minor / 100
+
+
+_SCHEMA_SETTERS = {
+    'id': _set_id,
+    'text': _set_text,
+    'interned': _set_interned,
+    'bool': _set_bool,
+    'date': _set_date,
+    'money': _set_money
+}
+
+
+class RecordSchema:
+    """Проверяет пачку словарей из файла и сразу строит из них записи нужного класса.
+
+    Даты дополнительно сохраняются как ordinal (атрибут <поле>_ordinal), суммы - в копейках
+    (amount_minor), приоритеты и категории интернируются. Ошибки собираются по всем записям
+    с их номерами, после чего выбрасывается SchemaError.
+    """
+
+    def __init__(self, cls, fields):
+        # fields: (имя, вид, значение по умолчанию или функция, вызываемая один раз на пачку).
+        self.cls = cls
+        self.fields = [(name, _SCHEMA_SETTERS[kind], default) for name, kind, default in fields]
+        self.names = {name for name, _, _ in fields}
+
+    def validate(self, rows, source='данные'):
+        if not isinstance(rows, list):
+            raise SchemaError(source, [(0, "ожидался список записей")])
+
+        defaults = {name: default() if callable(default) else default for name, _, default in self.fields}
+        records = []
+        errors = []
+        for position, row in enumerate(rows, 1):
+            try:
+                records.append(self.build(row, defaults))
+            except ValueError as e:
+                errors.append((position, str(e)))
+
+        if errors:
+            raise SchemaError(source, errors)
+        return records
+
+    def build(self, row, defaults):
+        if type(row) is not dict:
+            raise ValueError("запись должна быть объектом")
+        if not row.keys() <= self.names:
+            raise ValueError(f"неизвестные поля: {', '.join(sorted(row.keys() - self.names))}")
+
+        values = {}
+        for name, setter, default in self.fields:
+            value = row.get(name)
+            # Пустые дата и время, как и раньше в __init__, заменяются текущими.
+            if value is None or (value == '' and callable(default)):
+                if default is REQUIRED:
+                    raise ValueError(f"нет обязательного поля {name}")
+                value = defaults[name]
+                if value is None:
+                    values[name] = None
+                    continue
+            setter(values, name, value)
+
+        # Поля уже проверены и приведены, поэтому __init__ с его разбором строк не вызывается.
+        record = self.cls.__new__(self.cls)
+        record.__dict__ = values
+        return record
+
+
+TASK_SCHEMA = RecordSchema(Task, [
+    ('id', 'id', REQUIRED),
+    ('title', 'text', REQUIRED),
+    ('description', 'text', ''),
+    ('done', 'bool', False),
+    ('priority', 'interned', 'Низкий'),
+    ('due_date', 'date', lambda: datetime.now().strftime("%d-%m-%Y"))
+])
+
+NOTE_SCHEMA = RecordSchema(Note, [
+    ('id', 'id', REQUIRED),
+    ('title', 'text', REQUIRED),
+    ('content', 'text', REQUIRED),
+    ('timestamp', 'text', lambda: datetime.now().strftime("%d-%m-%Y %H:%M:%S"))
+])
+
+CONTACT_SCHEMA = RecordSchema(Contact, [
+    ('id', 'id', REQUIRED),
+    ('name', 'text', REQUIRED),
+    ('phone', 'text', ''),
+    ('email', 'text', '')
+])
+
+FINANCE_SCHEMA = RecordSchema(FinanceRecord, [
+    ('id', 'id', REQUIRED),
+    ('amount', 'money', REQUIRED),
+    ('category', 'interned', REQUIRED),
+    ('date', 'date', REQUIRED),
+    ('description', 'text', '')
+])
+
 class FinanceManager:
-    def __init__(self, filename='finance.json'):
+    def __init__(self, filename='finance.json', journal=None, codec=None, history=None):
         self.filename = filename
+        self.journal = journal
+        self.history = history
+        self.codec = codec
+        self.indexes = {}
         self.records = self.load_records()
+        if self.journal:
+            self.journal.bootstrap(self.records)
+
+    def _record_changes(self, changes, sources=None):
+        if changes:
+            self.indexes.clear()
+        if self.journal:
+            self.journal.append(changes, sources)
+        if self.history:
+            self.history.record(changes)
 
     def load_records(self):
         try:
-            with open(self.filename, 'r', encoding='utf-8') as file:
-                records_data = json.load(file)
-                return [FinanceRecord(**record) for record in records_data]
+            records_data = load_store(self.filename)
+            return FINANCE_SCHEMA.validate(records_data, self.filename)
         except FileNotFoundError:
             return []
 
     def save_records(self):
-        with open(self.filename, 'w', encoding='utf-8') as file:
-            json.dump([record.to_dict() for record in self.records], file, ensure_ascii=False, indent=4)
+        save_store(self.filename, [record.to_dict() for record in self.records], self.codec)
 
     def add_record(self, amount, category, date, description=''):
-        record_id = len(self.records) + 1
+        record_id = max((r.id for r in self.records), default=0) + 1
         new_record = FinanceRecord(record_id, amount, category, date, description)
         self.records.append(new_record)
         self.save_records()
+        self._record_changes([('insert', new_record, None)])
         print("Финансовая запись успешно добавлена!")
 
     def view_records(self):
@@ -370,20 +942,15 @@ class FinanceManager:
             print(
                 f"{record.id}: {record.amount} | Категория: {record.category} | Дата: {record.date} | Описание: {record.description}")
 
-    def generate_report(self, start_date=None, end_date=None):
-        total_income = 0.0
-        total_expense = 0.0
-
-        for record in self.records:
-            record_date = datetime.strptime(record.date, "%d-%m-%Y")
-
-            if (start_date and record_date < start_date) or (end_date and record_date > end_date):
-                continue
+    def report_totals(self, start_date=None, end_date=None):
+        start_ordinal = start_date.toordinal() if start_date else None
+        end_ordinal = end_date.toordinal() if end_date else None
+        total_income, total_expense = _sum_amounts(((record.amount_minor, record.date_ordinal) for record in self.records),
+                                                   start_ordinal, end_ordinal)
+        return total_income / 100, total_expense / 100
 
-            if record.amount > 0:
-                total_income += record.amount
-            else:
-                total_expense += abs(record.amount)
+    def generate_report(self, start_date=None, end_date=None):
+        total_income, total_expense = self.report_totals(start_date, end_date)
 
         print(f"Общий доход: {total_income:.2f}")
         print(f"Общие расходы: {total_expense:.2f}")
@@ -391,21 +958,1306 @@ class FinanceManager:
 
     def import_records(self, import_file):
         try:
-            with open(import_file, 'r', encoding='utf-8') as file:
-                imported_records = json.load(file)
-                for imported_record in imported_records:
-                    new_record = FinanceRecord(**imported_record)
-                    self.records.append(new_record)
-                self.save_records()
-                print("Финансовые записи успешно импортированы!")
+            imported_records = load_store(import_file)
+            new_records = FINANCE_SCHEMA.validate(imported_records, import_file)
+            _assign_free_ids(new_records, (record.id for record in self.records))
+            self.records.extend(new_records)
+            self.save_records()
+            self._record_changes([('insert', record, None) for record in new_records])
+            print("Финансовые записи успешно импортированы!")
         except FileNotFoundError:
             print("Файл для импорта не найден.")
+        except SchemaError as e:
+            print(f"Импорт отменен.\n{e}")
 
     def export_records(self, export_file):
         with open(export_file, 'w', encoding='utf-8') as file:
             json.dump([record.to_dict() for record in self.records], file, ensure_ascii=False, indent=4)
         print("Финансовые записи успешно экспортированы!")
 
+    def export_changes(self, export_file, since=0):
+        _export_changes(self.journal, export_file, since)
+
+    def apply_changes(self, import_file):
+        delta = _read_delta(self.journal, import_file, FINANCE_SCHEMA, lambda ids: _lookup_ids(self.records, ids))
+        if delta is None:
+            return
+        applied = self.apply_batch(delta["changes"])
+        _finish_changes(self.journal, delta, applied)
+
+    def apply_batch(self, changes):
+        applied, sources = _apply_changes(self.records, changes)
+        if applied:
+            self.save_records()
+            self._record_changes(applied, sources)
+        return applied
+
+# Одни и те же даты повторяются в тысячах записей, поэтому разбор кешируется.
+@lru_cache(maxsize=4096)
+def _date_ordinal(date):
+    return datetime.strptime(date, "%d-%m-%Y").toordinal()
+
+
+def _date_ordinal_or_none(date):
+    try:
+        return _date_ordinal(date)
+    except (TypeError, ValueError):
+        return None
+
+
+def _partition_key(date):
+    # Даты хранятся как ДД-ММ-ГГГГ, раздел журнала - это месяц ГГГГ-ММ.
+    return f"{date[6:10]}-{date[3:5]}"
+
+
+def _sum_amounts(entries, start_ordinal=None, end_ordinal=None):
+    # Суммы в копейках, поэтому итоги точные и не зависят от порядка сложения разделов.
+    total_income = 0
+    total_expense = 0
+    check_dates = start_ordinal is not None or end_ordinal is not None
+
+    for amount, record_ordinal in entries:
+        if check_dates:
+            if ((start_ordinal is not None and record_ordinal < start_ordinal) or
+                    (end_ordinal is not None and record_ordinal > end_ordinal)):
+                continue
+
+        if amount > 0:
+            total_income += amount
+        else:
+            total_expense += abs(amount)
+
+    return total_income, total_expense
+
+
+def _header_overlaps(header, start_ordinal, end_ordinal):
+    if not header["count"]:
+        return False
+    if start_ordinal is not None and _date_ordinal(header["last_date"]) < start_ordinal:
+        return False
+    if end_ordinal is not None and _date_ordinal(header["first_date"]) > end_ordinal:
+        return False
+    return True
+
+
+def _header_within(header, start_ordinal, end_ordinal):
+    return ((start_ordinal is None or _date_ordinal(header["first_date"]) >= start_ordinal) and
+            (end_ordinal is None or _date_ordinal(header["last_date"]) <= end_ordinal))
+
+
+def _partition_totals(path, start_ordinal=None, end_ordinal=None):
+    # Выполняется в отдельном процессе, поэтому читает раздел прямо с диска.
+    with open(path, 'r', encoding='utf-8') as file:
+        header = loads_line(file.readline())
+        if _header_within(header, start_ordinal, end_ordinal):
+            start_ordinal = end_ordinal = None
+        records = FINANCE_SCHEMA.validate([loads_line(line) for line in file], path)
+        return _sum_amounts(((record.amount_minor, record.date_ordinal) for record in records), start_ordinal, end_ordinal)
+
+
+class PartitionedFinanceManager(FinanceManager):
+    """Журнал финансов, разбитый на разделы по месяцам (finance/ГГГГ-ММ.jsonl).
+
+    Первая строка раздела - заголовок с количеством записей, границами дат и максимальным id,
+    далее по одной записи на строку. Записи разделов читаются с диска только при обращении к ним.
+    """
+
+    def __init__(self, directory='finance', legacy_filename='finance.json', max_workers=None, journal=None,
+                 history=None):
+        self.directory = directory
+        self.filename = legacy_filename
+        self.max_workers = max_workers
+        self.journal = journal
+        # История подключается после переноса старого файла, чтобы перенос нельзя было "отменить".
+        self.history = None
+        self.indexes = {}
+        self.partitions = {}
+        self.headers = self.load_headers()
+        if not self.headers and os.path.exists(legacy_filename):
+            self.migrate_legacy()
+        if self.journal and not self.journal.seq and self.headers:
+            self.journal.bootstrap(self.records)
+        self.history = history
+
+    @property
+    def records(self):
+        for key in self.headers:
+            self.get_partition(key)
+        return [record for key in sorted(self.partitions) for record in self.partitions[key]]
+
+    def partition_path(self, key):
+        return os.path.join(self.directory, f"{key}.jsonl")
+
+    def load_headers(self):
+        headers = {}
+        if not os.path.isdir(self.directory):
+            return headers
+        for name in os.listdir(self.directory):
+            if not name.endswith('.jsonl'):
+                continue
+            with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as file:
+                header = loads_line(file.readline())
+            headers[header["partition"]] = header
+        return headers
+
+    def load_partition(self, key):
+        try:
+            with open(self.partition_path(key), 'r', encoding='utf-8') as file:
+                file.readline()
+                return FINANCE_SCHEMA.validate([loads_line(line) for line in file], self.partition_path(key))
+        except FileNotFoundError:
+            return []
+
+    def get_partition(self, key):
+        if key not in self.partitions:
+            self.partitions[key] = self.load_partition(key) if key in self.headers else []
+        return self.partitions[key]
+
+    def load_records(self):
+        self.indexes = {}
+        self.partitions = {}
+        self.headers = self.load_headers()
+        return self.records
+
+    def save_partition(self, key):
+        partition = self.partitions[key]
+        ordinals = [record.date_ordinal for record in partition]
+        header = {
+            "partition": key,
+            "version": 1,
+            "count": len(partition),
+            "first_date": datetime.fromordinal(min(ordinals)).strftime("%d-%m-%Y") if ordinals else None,
+            "last_date": datetime.fromordinal(max(ordinals)).strftime("%d-%m-%Y") if ordinals else None,
+            "max_id": max((record.id for record in partition), default=0)
+        }
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.partition_path(key)
+        # Пишем во временный файл, чтобы сбой не оставил раздел наполовину записанным.
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            file.write(dumps_line(header) + '\n')
+            for record in partition:
+                file.write(dumps_line(record.to_dict()) + '\n')
+        os.replace(path + '.tmp', path)
+        self.headers[key] = header
+
+    def save_records(self):
+        for key in self.partitions:
+            self.save_partition(key)
+
+    def add_records(self, records):
+        touched = set()
+        for record in records:
+            key = _partition_key(record.date)
+            self.get_partition(key).append(record)
+            touched.add(key)
+        for key in touched:
+            self.save_partition(key)
+        self._record_changes([('insert', record, None) for record in records])
+
+    def migrate_legacy(self):
+        self.add_records(FinanceManager.load_records(self))
+
+    def locate(self, ids):
+        # Читаются только разделы, в которых по заголовку могут быть такие id.
+        smallest_id = min(ids, default=None)
+        if smallest_id is None:
+            return {}
+        for key, header in self.headers.items():
+            if header["max_id"] >= smallest_id:
+                self.get_partition(key)
+        wanted = set(ids)
+        return {record.id: key for key, partition in self.partitions.items()
+                for record in partition if record.id in wanted}
+
+    def lookup_ids(self, ids):
+        locations = self.locate(ids)
+        existing = {record.id: record for key in set(locations.values())
+                    for record in self.partitions[key] if record.id in locations}
+        return existing, self.next_id()
+
+    def next_id(self):
+        loaded = (record.id for partition in self.partitions.values() for record in partition)
+        return max(max((header["max_id"] for header in self.headers.values()), default=0),
+                   max(loaded, default=0)) + 1
+
+    def add_record(self, amount, category, date, description=''):
+        new_record = FinanceRecord(self.next_id(), amount, category, date, description)
+        self.add_records([new_record])
+        print("Финансовая запись успешно добавлена!")
+
+    def report_totals(self, start_date=None, end_date=None):
+        start_ordinal = start_date.toordinal() if start_date else None
+        end_ordinal = end_date.toordinal() if end_date else None
+        keys = [key for key, header in self.headers.items() if _header_overlaps(header, start_ordinal, end_ordinal)]
+
+        partial_sums = []
+        pending = []
+        for key in keys:
+            if key not in self.partitions:
+                pending.append(self.partition_path(key))
+                continue
+            if _header_within(self.headers[key], start_ordinal, end_ordinal):
+                partial_sums.append(_sum_amounts((record.amount_minor, record.date_ordinal)
+                                                 for record in self.partitions[key]))
+            else:
+                partial_sums.append(_sum_amounts(((record.amount_minor, record.date_ordinal)
+                                                  for record in self.partitions[key]), start_ordinal, end_ordinal))
+
+        starts = [start_ordinal] * len(pending)
+        ends = [end_ordinal] * len(pending)
+        if len(pending) >= PARALLEL_REPORT_MIN_PARTITIONS and self.max_workers != 1:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                partial_sums.extend(executor.map(_partition_totals, pending, starts, ends))
+        else:
+            partial_sums.extend(map(_partition_totals, pending, starts, ends))
+
+        return (sum(income for income, _ in partial_sums) / 100,
+                sum(expense for _, expense in partial_sums) / 100)
+
+    def import_records(self, import_file):
+        try:
+            imported_records = load_store(import_file)
+            new_records = FINANCE_SCHEMA.validate(imported_records, import_file)
+            _assign_free_ids(new_records, self.locate([record.id for record in new_records]), self.next_id())
+            self.add_records(new_records)
+            print("Финансовые записи успешно импортированы!")
+        except FileNotFoundError:
+            print("Файл для импорта не найден.")
+        except SchemaError as e:
+            print(f"Импорт отменен.\n{e}")
+
+    def apply_changes(self, import_file):
+        delta = _read_delta(self.journal, import_file, FINANCE_SCHEMA, self.lookup_ids)
+        if delta is None:
+            return
+        applied = self.apply_batch(delta["changes"])
+        _finish_changes(self.journal, delta, applied)
+
+    def apply_batch(self, changes):
+        # Изменения раскладываются по разделам, так что переписываются только затронутые месяцы.
+        # Запись ищется в разделе, где она лежит сейчас: если месяц изменился, из старого раздела она удаляется.
+        locations = self.locate([change["item"].id for change in changes])
+        by_partition = {}
+        for change in changes:
+            item = change["item"]
+            old_key = locations.get(item.id)
+            if change["op"] == 'delete':
+                if old_key:
+                    by_partition.setdefault(old_key, []).append(change)
+                    del locations[item.id]
+                continue
+            new_key = _partition_key(item.date)
+            if old_key and old_key != new_key:
+                by_partition.setdefault(old_key, []).append(dict(change, op='delete'))
+            by_partition.setdefault(new_key, []).append(change)
+            locations[item.id] = new_key
+
+        applied = []
+        sources = []
+        for key, partition_changes in by_partition.items():
+            partition_applied, partition_sources = _apply_changes(self.get_partition(key), partition_changes)
+            if partition_applied:
+                self.save_partition(key)
+                applied.extend(partition_applied)
+                sources.extend(partition_sources)
+
+        self._record_changes(applied, sources)
+        return applied
+
+
+class ChangeJournal:
+    """Журнал изменений одного хранилища (задач, заметок, контактов или финансов).
+
+    Каждая вставка, изменение и удаление дописывается строкой с монотонно растущим номером seq,
+    поэтому другой копии можно передать только изменения после известного ей номера.
+    В файле состояния хранится id хранилища и номера уже применённых изменений других копий.
+
+    Копии выдают id независимо, поэтому одна и та же запись в разных копиях может иметь разные id.
+    Между копиями запись узнается по ключу: id копии, создавшей запись, и id записи в ней.
+    Для записей, созданных другими копиями, в состоянии хранится соответствие ключа и местного id.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.state_filename = filename + '.state'
+        self.state = self.load_state()
+        self.seq = self.load_last_seq()
+
+    def load_state(self):
+        try:
+            with open(self.state_filename, 'r', encoding='utf-8') as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            state = {"store_id": uuid.uuid4().hex, "applied": {}}
+            self.save_state(state)
+        # rows: местный id записи другой копии -> ее ключ; aliases: ключ -> местный id записи,
+        # которая уже была здесь (например, обе копии начаты с одного файла).
+        state.setdefault("rows", {})
+        state.setdefault("aliases", {})
+        return state
+
+    def save_state(self, state=None):
+        with open(self.state_filename, 'w', encoding='utf-8') as file:
+            json.dump(state or self.state, file, ensure_ascii=False)
+
+    def load_last_seq(self):
+        try:
+            with open(self.filename, 'rb') as file:
+                size = file.seek(0, os.SEEK_END)
+                if not size:
+                    return 0
+                # Читаем с конца файла ровно последнюю строку, а не весь журнал.
+                position = size - 1
+                while position > 0:
+                    file.seek(position - 1)
+                    if file.read(1) == b'\n':
+                        break
+                    position -= 1
+                file.seek(position)
+                return loads_line(file.readline())["seq"]
+        except FileNotFoundError:
+            return 0
+
+    def append(self, changes, sources=None):
+        if not changes:
+            return
+        rows = self.state["rows"]
+        forgotten = False
+        with open(self.filename, 'a', encoding='utf-8') as file:
+            for (op, item, _), source in zip(changes, sources or [None] * len(changes)):
+                self.seq += 1
+                entry = {"seq": self.seq, "op": op, "record": item.to_dict()}
+                # Изменение, пришедшее от другой копии, помечается ее id и номером,
+                # чтобы при следующем обмене не вернуться к ней же и не затереть более новую правку.
+                if source:
+                    entry["origin"], entry["origin_seq"] = source
+                key = rows.get(str(item.id))
+                if key:
+                    entry["key"] = key
+                file.write(dumps_line(entry) + '\n')
+                if op == 'delete':
+                    # Удаленный id может достаться новой местной записи, соответствие ему больше не относится.
+                    forgotten = self.forget(item.id) or forgotten
+        if forgotten:
+            self.save_state()
+
+    def forget(self, local_id):
+        aliases = self.state["aliases"]
+        names = [name for name, alias_id in aliases.items() if alias_id == local_id]
+        for name in names:
+            del aliases[name]
+        return self.state["rows"].pop(str(local_id), None) is not None or bool(names)
+
+    def bootstrap(self, items):
+        # Данные, появившиеся до включения журнала, записываются как вставки, чтобы их получила и новая копия.
+        if not self.seq:
+            self.append([('insert', item, None) for item in items])
+
+    @staticmethod
+    def _line_start(file, position):
+        if position:
+            file.seek(position - 1)
+            file.readline()
+        else:
+            file.seek(0)
+        return file.tell()
+
+    def changes_since(self, since):
+        try:
+            with open(self.filename, 'rb') as file:
+                # Номера в журнале возрастают, поэтому начало нужного хвоста ищется бинарным поиском по смещению.
+                low, high = 0, file.seek(0, os.SEEK_END)
+                while low < high:
+                    middle = (low + high) // 2
+                    self._line_start(file, middle)
+                    line = file.readline()
+                    if not line or loads_line(line)["seq"] > since:
+                        high = middle
+                    else:
+                        low = middle + 1
+                self._line_start(file, low)
+                return [loads_line(line) for line in file]
+        except FileNotFoundError:
+            return []
+
+    def export_delta(self, since=0):
+        return {
+            "store_id": self.state["store_id"],
+            "since": since,
+            "until": self.seq,
+            "changes": self.changes_since(since)
+        }
+
+    def pending(self, delta):
+        if delta["store_id"] == self.state["store_id"]:
+            return []
+        changes = []
+        for change in delta["changes"]:
+            # Строка без origin сделана самой отправившей копией, строка без key - о ее собственной записи.
+            change.setdefault("origin", delta["store_id"])
+            change.setdefault("origin_seq", change["seq"])
+            change.setdefault("key", [delta["store_id"], change["record"]["id"]])
+            if change["origin"] == self.state["store_id"]:
+                continue
+            if change["origin_seq"] > self.state["applied"].get(change["origin"], 0):
+                changes.append(change)
+        return changes
+
+    def localize(self, changes, lookup):
+        # Переводит id записей в изменениях другой копии в местные id. lookup(ids) возвращает
+        # местные записи с такими id и первый свободный id.
+        own = self.state["store_id"]
+        rows = self.state["rows"]
+        aliases = self.state["aliases"]
+        known = {f"{creator}:{creator_id}": int(local_id) for local_id, (creator, creator_id) in rows.items()}
+        known.update(aliases)
+        unknown = [change["key"][1] for change in changes
+                   if change["key"][0] != own and "{}:{}".format(*change["key"]) not in known]
+        existing, next_id = lookup(unknown)
+
+        localized = []
+        for change in changes:
+            item = change["item"]
+            creator, creator_id = change["key"]
+            name = f"{creator}:{creator_id}"
+            if creator == own:
+                local_id = creator_id
+            elif name in known:
+                local_id = known[name]
+            else:
+                row = existing.get(creator_id)
+                free = str(creator_id) not in rows
+                if change["op"] == 'delete':
+                    # Неизвестную запись удалить нельзя, кроме случая, когда это та же запись, что и здесь.
+                    if row is None or not free:
+                        continue
+                    local_id = creator_id
+                elif free and row is None:
+                    local_id = creator_id
+                    rows[str(local_id)] = [creator, creator_id]
+                elif free and (change["op"] == 'update' or row.to_dict() == item.to_dict()):
+                    local_id = aliases[name] = creator_id
+                else:
+                    # id уже занят другой записью: новая запись получает свободный id и не затирает местную.
+                    local_id = next_id
+                    rows[str(local_id)] = [creator, creator_id]
+                next_id = max(next_id, local_id + 1)
+                known[name] = local_id
+            item.id = local_id
+            localized.append(change)
+        self.save_state()
+        return localized
+
+    def mark_applied(self, delta):
+        store_id = delta["store_id"]
+        if store_id == self.state["store_id"]:
+            return
+        applied = self.state["applied"]
+        applied[store_id] = max(applied.get(store_id, 0), delta["until"])
+        for change in delta["changes"]:
+            applied[change["origin"]] = max(applied.get(change["origin"], 0), change["origin_seq"])
+        self.save_state()
+
+
+class History:
+    """Отмена, повтор и контрольные точки для одного менеджера.
+
+    Копия хранилища не делается: для каждого действия запоминаются только затронутые записи
+    до и после него, а отмена применяет к данным в памяти обратные операции через apply_batch.
+    Поэтому память растет с числом изменений, а не с размером данных. max_rows ограничивает
+    число записей во всех сохраненных действиях: самые старые действия вытесняются целиком,
+    но последнее действие хранится всегда, даже если одно оно больше max_rows (например,
+    большой импорт). Каждое действие получает номер версии, контрольная точка - это
+    просто сохраненный номер.
+    """
+
+    def __init__(self, max_rows=10000):
+        self.max_rows = max_rows
+        self.rows = 0
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.checkpoints = {}
+        self.version = 0
+        self._last_version = 0
+        self._replaying = False
+
+    def record(self, changes):
+        if self._replaying or not changes:
+            return
+        # Вставленные и измененные записи остаются в хранилище и могут меняться дальше, поэтому копируются.
+        # Для удаления вместо прежней версии хранится позиция, на которую запись вернет отмена.
+        snapshot = [(op, item if op == 'delete' else copy.copy(item), before) for op, item, before in changes]
+        self._last_version += 1
+        self.undo_stack.append((self.version, self._last_version, snapshot))
+        self.version = self._last_version
+        self.rows += len(snapshot) - sum(len(entry[2]) for entry in self.redo_stack)
+        self.redo_stack.clear()
+        while self.rows > self.max_rows and len(self.undo_stack) > 1:
+            self.rows -= len(self.undo_stack.popleft()[2])
+
+    @staticmethod
+    def _backward(snapshot):
+        changes = []
+        for op, after, before in reversed(snapshot):
+            if op == 'insert':
+                changes.append({"op": 'delete', "item": after})
+            elif op == 'delete':
+                changes.append({"op": 'update', "item": copy.copy(after), "position": before})
+            else:
+                changes.append({"op": 'update', "item": copy.copy(before)})
+        return changes
+
+    @staticmethod
+    def _forward(snapshot):
+        return [{"op": op, "item": copy.copy(after)} for op, after, _ in snapshot]
+
+    def _replay(self, manager, changes):
+        self._replaying = True
+        try:
+            manager.apply_batch(changes)
+        finally:
+            self._replaying = False
+
+    def _step_back(self, manager, steps):
+        changes = []
+        for _ in range(steps):
+            entry = self.undo_stack.pop()
+            changes.extend(self._backward(entry[2]))
+            self.redo_stack.append(entry)
+            self.version = entry[0]
+        # Все шаги применяются одним пакетом, так что хранилище сохраняется один раз.
+        self._replay(manager, changes)
+
+    def _step_forward(self, manager, steps):
+        changes = []
+        for _ in range(steps):
+            entry = self.redo_stack.pop()
+            changes.extend(self._forward(entry[2]))
+            self.undo_stack.append(entry)
+            self.version = entry[1]
+        self._replay(manager, changes)
+
+    def undo(self, manager):
+        if not self.undo_stack:
+            print("Нет действий для отмены.")
+            return False
+        self._step_back(manager, 1)
+        print("Последнее действие отменено.")
+        return True
+
+    def redo(self, manager):
+        if not self.redo_stack:
+            print("Нет отмененных действий для повтора.")
+            return False
+        self._step_forward(manager, 1)
+        print("Действие повторено.")
+        return True
+
+    def checkpoint(self, name):
+        self.checkpoints[name] = self.version
+        print(f"Контрольная точка '{name}' создана.")
+
+    def restore(self, manager, name):
+        if name not in self.checkpoints:
+            print("Контрольная точка не найдена.")
+            return False
+
+        target = self.checkpoints[name]
+        undo_versions = [entry[0] for entry in self.undo_stack]
+        redo_versions = [entry[1] for entry in self.redo_stack]
+        if target == self.version:
+            pass
+        elif target in undo_versions:
+            self._step_back(manager, len(undo_versions) - undo_versions.index(target))
+        elif target in redo_versions:
+            self._step_forward(manager, len(redo_versions) - redo_versions.index(target))
+        else:
+            print("Контрольная точка недоступна: ее изменения вытеснены из истории или отменены и перезаписаны.")
+            return False
+
+        print(f"Данные возвращены к контрольной точке '{name}'.")
+        return True
+
+
+def _assign_free_ids(new_items, used_ids, next_id=1):
+    # Отмена и повтор находят записи по id, поэтому импортированная запись с занятым id получает новый.
+    used = set(used_ids)
+    next_id = max([next_id] + [item_id + 1 for item_id in used] + [item.id + 1 for item in new_items])
+    renumbered = 0
+    for item in new_items:
+        if item.id in used:
+            item.id = next_id
+            next_id += 1
+            renumbered += 1
+        used.add(item.id)
+    if renumbered:
+        print(f"Записей с уже занятым id: {renumbered}, им назначены новые id.")
+
+
+def _apply_changes(items, changes):
+    # Вставка и изменение заменяют запись с тем же id, удаление отсутствующей записи ничего не делает,
+    # поэтому повторное применение тех же изменений не меняет данные.
+    # Вместе с примененными изменениями возвращается их источник (id копии и номер), если он известен.
+    # Для удаления вместо прежней версии возвращается позиция записи в списке на момент удаления.
+    positions = {item.id: position for position, item in enumerate(items)}
+    removed = []
+    applied = []
+    sources = []
+
+    for change in changes:
+        item = change["item"]
+        position = positions.get(item.id)
+        source = (change["origin"], change["origin_seq"]) if "origin" in change else None
+        if change["op"] == 'delete':
+            if position is not None:
+                applied.append(('delete', items[position], position - bisect_left(removed, position)))
+                sources.append(source)
+                insort(removed, position)
+                items[position] = None
+                del positions[item.id]
+            continue
+
+        if position is None and "position" in change:
+            # Отмена удаления возвращает запись на прежнее место, сдвигая следующие.
+            items[:] = [existing for existing in items if existing is not None]
+            items.insert(change["position"], item)
+            positions = {existing.id: index for index, existing in enumerate(items)}
+            removed = []
+            applied.append(('insert', item, None))
+        elif position is None:
+            positions[item.id] = len(items)
+            items.append(item)
+            applied.append(('insert', item, None))
+        else:
+            applied.append(('update', item, items[position]))
+            items[position] = item
+        sources.append(source)
+
+    items[:] = [item for item in items if item is not None]
+    return applied, sources
+
+
+def _export_changes(journal, export_file, since=0):
+    if not journal:
+        print("Журнал изменений не включен.")
+        return
+    delta = journal.export_delta(since)
+    with open(export_file, 'w', encoding='utf-8') as file:
+        file.write(dumps_line(delta))
+    print(f"Экспортировано изменений: {len(delta['changes'])} (до номера {delta['until']}).")
+
+
+def _lookup_ids(items, ids):
+    wanted = set(ids)
+    return ({item.id: item for item in items if item.id in wanted},
+            max((item.id for item in items), default=0) + 1)
+
+
+def _check_delta(delta, source):
+    # Файл изменений выбирает пользователь, поэтому до применения проверяется его форма.
+    if (not isinstance(delta, dict) or not isinstance(delta.get("store_id"), str)
+            or not isinstance(delta.get("until"), int) or not isinstance(delta.get("changes"), list)):
+        raise SchemaError(source, [(0, "это не файл изменений: нужны store_id, until и список changes")])
+
+    errors = []
+    for position, change in enumerate(delta["changes"], 1):
+        if (not isinstance(change, dict) or not isinstance(change.get("seq"), int)
+                or change.get("op") not in ('insert', 'update', 'delete') or not isinstance(change.get("record"), dict)):
+            errors.append((position, "ожидались seq, op (insert, update или delete) и record"))
+        elif not isinstance(change["record"].get("id"), int):
+            errors.append((position, "у записи нет числового id"))
+        elif "origin" in change and not (isinstance(change["origin"], str) and isinstance(change.get("origin_seq"), int)):
+            errors.append((position, "origin должен быть строкой, origin_seq - числом"))
+        elif "key" in change and not (isinstance(change["key"], list) and len(change["key"]) == 2
+                                      and isinstance(change["key"][0], str) and isinstance(change["key"][1], int)):
+            errors.append((position, "key должен быть парой [id копии, id записи]"))
+    if errors:
+        raise SchemaError(source, errors)
+
+
+def _read_delta(journal, import_file, schema, lookup):
+    try:
+        with open(import_file, 'r', encoding='utf-8') as file:
+            delta = loads_line(file.read())
+        _check_delta(delta, import_file)
+    except FileNotFoundError:
+        print("Файл для импорта не найден.")
+        return None
+    except SchemaError as e:
+        print(f"Изменения не применены.\n{e}")
+        return None
+    except ValueError as e:
+        print(f"Изменения не применены: файл {import_file} не удалось разобрать ({e}).")
+        return None
+    if journal:
+        delta["changes"] = journal.pending(delta)
+
+    try:
+        items = schema.validate([change["record"] for change in delta["changes"]], import_file)
+    except SchemaError as e:
+        print(f"Изменения не применены.\n{e}")
+        return None
+    for change, item in zip(delta["changes"], items):
+        change["item"] = item
+    if journal:
+        delta["changes"] = journal.localize(delta["changes"], lookup)
+    return delta
+
+
+def _finish_changes(journal, delta, applied):
+    if journal:
+        journal.mark_applied(delta)
+    print(f"Применено изменений: {len(applied)}.")
+
+
+class QueryError(ValueError):
+    pass
+
+
+# Источники запросов: имя поля в запросе -> (атрибут записи, тип), и поля, по которым строятся индексы.
+QUERY_SOURCES = {
+    'tasks': {
+        'items': 'tasks',
+        'fields': {
+            'id': ('id', 'number'),
+            'title': ('title', 'text'),
+            'description': ('description', 'text'),
+            'done': ('done', 'bool'),
+            'priority': ('priority', 'text'),
+            'due': ('due_date', 'date')
+        },
+        'hash_indexes': ['id', 'priority', 'done'],
+        'sorted_indexes': ['due']
+    },
+    'notes': {
+        'items': 'notes',
+        'fields': {
+            'id': ('id', 'number'),
+            'title': ('title', 'text'),
+            'content': ('content', 'text'),
+            'timestamp': ('timestamp', 'text')
+        },
+        'hash_indexes': ['id'],
+        'sorted_indexes': []
+    },
+    'contacts': {
+        'items': 'contacts',
+        'fields': {
+            'id': ('id', 'number'),
+            'name': ('name', 'text'),
+            'phone': ('phone', 'text'),
+            'email': ('email', 'text')
+        },
+        'hash_indexes': ['id'],
+        'sorted_indexes': []
+    },
+    'finance': {
+        'items': 'records',
+        'fields': {
+            'id': ('id', 'number'),
+            'amount': ('amount', 'money'),
+            'category': ('category', 'text'),
+            'date': ('date', 'date'),
+            'description': ('description', 'text')
+        },
+        'hash_indexes': ['id', 'category'],
+        'sorted_indexes': ['date']
+    }
+}
+
+QUERY_OPERATORS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'contains': lambda value, term: term.lower() in str(value).lower()
+}
+
+QUERY_AGGREGATES = ['count', 'sum', 'avg', 'min', 'max']
+
+_QUERY_TOKEN = re.compile(r"""\s*(?:
+    (?P<string>'[^']*'|"[^"]*")|
+    (?P<date>\d{2}-\d{2}-\d{4})|
+    (?P<number>-?\d+(?:\.\d+)?)|
+    (?P<op><=|>=|!=|=|<|>)|
+    (?P<punct>[(),*])|
+    (?P<word>[^\s'"(),<>=!]+)
+)""", re.VERBOSE)
+
+
+def _field_value(item, attribute, kind):
+    # Для дат и сумм берутся уже разобранные при загрузке ordinal и копейки.
+    if kind == 'date':
+        return getattr(item, attribute + '_ordinal')
+    if kind == 'money':
+        return getattr(item, attribute + '_minor')
+    return getattr(item, attribute)
+
+
+def _display_value(value, kind):
+    if value is None:
+        return None
+    if kind == 'date':
+        return datetime.fromordinal(value).strftime("%d-%m-%Y")
+    if kind == 'money':
+        return value / 100
+    return value
+
+
+def _sort_key(value):
+    # Пустые значения всегда оказываются в конце.
+    return (1, 0) if value is None else (0, value)
+
+
+class Query:
+    def __init__(self, source):
+        self.source = source
+        self.select = []
+        self.conditions = []
+        self.group_by = None
+        self.order_by = None
+        self.descending = False
+        self.limit = None
+
+    @property
+    def is_aggregate(self):
+        return self.group_by is not None or any(kind != 'field' for kind, _ in self.select)
+
+
+class QueryParser:
+    """Разбор запросов вида:
+
+    tasks where priority = 'Высокий' and due < 01-01-2027 order by due limit 50
+    finance select category, count, sum(amount) where date >= 01-01-2024 group by category
+    """
+
+    def __init__(self, text):
+        self.tokens = []
+        position = 0
+        text = text.strip()
+        while position < len(text):
+            match = _QUERY_TOKEN.match(text, position)
+            if not match or match.end() == position:
+                raise QueryError(f"Непонятный фрагмент запроса: {text[position:]}")
+            self.tokens.append((match.lastgroup, match.group(match.lastgroup)))
+            position = match.end()
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        if token[0] is None:
+            raise QueryError("Неожиданный конец запроса.")
+        self.position += 1
+        return token
+
+    def accept(self, word):
+        kind, value = self.peek()
+        if kind == 'word' and value.lower() == word:
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, word):
+        if not self.accept(word):
+            raise QueryError(f"Ожидалось '{word}'.")
+
+    def field(self, fields):
+        kind, value = self.next()
+        name = value.lower() if kind == 'word' else None
+        if name not in fields:
+            raise QueryError(f"Неизвестное поле: {value}. Доступны: {', '.join(fields)}")
+        return name
+
+    def parse(self):
+        kind, source = self.next()
+        source = source.lower()
+        if kind != 'word' or source not in QUERY_SOURCES:
+            raise QueryError(f"Неизвестный источник: {source}. Доступны: {', '.join(QUERY_SOURCES)}")
+        fields = QUERY_SOURCES[source]['fields']
+        query = Query(source)
+
+        if self.accept('select'):
+            query.select.append(self.select_item(fields))
+            while self.peek() == ('punct', ','):
+                self.next()
+                query.select.append(self.select_item(fields))
+
+        if self.accept('where'):
+            query.conditions.append(self.condition(fields))
+            while self.accept('and'):
+                query.conditions.append(self.condition(fields))
+
+        if self.accept('group'):
+            self.expect('by')
+            query.group_by = self.field(fields)
+
+        if self.accept('order'):
+            self.expect('by')
+            query.order_by = self.order_name(query, fields)
+            if self.accept('desc'):
+                query.descending = True
+            else:
+                self.accept('asc')
+
+        if self.accept('limit'):
+            kind, value = self.next()
+            if kind != 'number' or not value.isdigit():
+                raise QueryError("После limit ожидается целое число.")
+            query.limit = int(value)
+
+        if self.peek()[0] is not None:
+            raise QueryError(f"Лишний фрагмент запроса: {self.peek()[1]}")
+
+        if query.is_aggregate:
+            for kind, name in query.select:
+                if kind == 'field' and name != query.group_by:
+                    raise QueryError(f"Поле {name} должно быть в group by.")
+        return query
+
+    def select_item(self, fields):
+        kind, value = self.peek()
+        name = value.lower() if kind == 'word' else None
+        if name in QUERY_AGGREGATES:
+            self.next()
+            if self.peek() != ('punct', '('):
+                if name != 'count':
+                    raise QueryError(f"Для {name} нужно указать поле: {name}(поле).")
+                return 'count', None
+            self.next()
+            if name == 'count' and self.peek() == ('punct', '*'):
+                self.next()
+                argument = None
+            else:
+                argument = self.field(fields)
+                if name in ('sum', 'avg') and fields[argument][1] not in ('number', 'money'):
+                    raise QueryError(f"{name} применим только к числовым полям.")
+            if self.next() != ('punct', ')'):
+                raise QueryError("Ожидалась ')'.")
+            return name, argument
+        return 'field', self.field(fields)
+
+    def order_name(self, query, fields):
+        if not query.is_aggregate:
+            return self.field(fields)
+        item = self.select_item(fields)
+        # Без select итоги состоят из одного count, как и в aggregate.
+        if item not in (query.select or [('count', None)]) and item != ('field', query.group_by):
+            raise QueryError("Сортировать итоги можно только по выбранным столбцам.")
+        return _column_name(item)
+
+    def condition(self, fields):
+        name = self.field(fields)
+        kind = fields[name][1]
+        op_kind, op = self.next()
+        op = op.lower()
+        if op not in QUERY_OPERATORS or (op_kind == 'word' and op != 'contains'):
+            raise QueryError(f"Неизвестный оператор: {op}")
+        if op == 'contains' and kind != 'text':
+            raise QueryError("contains применим только к текстовым полям.")
+
+        value_kind, raw = self.next()
+        text = raw[1:-1] if value_kind == 'string' else raw
+        try:
+            if kind == 'date':
+                value = _date_ordinal(text)
+            elif kind == 'number':
+                value = float(text)
+            elif kind == 'money':
+                value = _to_minor(text)
+            elif kind == 'bool':
+                if text.lower() not in ('true', 'false'):
+                    raise ValueError(text)
+                value = text.lower() == 'true'
+            else:
+                value = text
+        except ValueError:
+            raise QueryError(f"Неверное значение для поля {name}: {raw}")
+        return name, op, value, raw
+
+
+def _column_name(item):
+    kind, name = item
+    if kind == 'field':
+        return name
+    return f"{kind}({name})" if name else kind
+
+
+def parse_query(text):
+    return QueryParser(text).parse()
+
+
+class QueryPlan:
+    def __init__(self, query, access, description, estimate, candidates, ordered=False):
+        self.query = query
+        self.access = access
+        self.description = description
+        self.estimate = estimate
+        self.candidates = candidates
+        self.ordered = ordered
+        self.rows_examined = 0
+        self.rows_matched = 0
+        self.rows_returned = 0
+
+    def describe(self):
+        query = self.query
+        lines = [f"План запроса к {query.source}:",
+                 f"  Доступ: {self.description} (оценка: {self.estimate} строк)"]
+        if query.conditions:
+            conditions = " and ".join(f"{name} {op} {raw}" for name, op, _, raw in query.conditions)
+            lines.append(f"  Фильтр: {conditions}")
+        if query.is_aggregate:
+            columns = ", ".join(_column_name(item) for item in query.select) or "count"
+            grouping = f" по {query.group_by}" if query.group_by else ""
+            lines.append(f"  Агрегация{grouping}: {columns}")
+        if query.order_by:
+            direction = "desc" if query.descending else "asc"
+            if self.ordered:
+                lines.append(f"  Сортировка: {query.order_by} {direction} (по индексу, без сортировки)")
+            else:
+                lines.append(f"  Сортировка: {query.order_by} {direction}")
+        if query.limit is not None:
+            lines.append(f"  Лимит: {query.limit}")
+        lines.append(f"Просмотрено строк: {self.rows_examined}, подошло: {self.rows_matched}, "
+                     f"возвращено: {self.rows_returned}")
+        return lines
+
+
+class QueryEngine:
+    """Выполняет запросы к менеджерам, выбирая индекс или полный просмотр.
+
+    Индексы строятся при первом запросе и хранятся в manager.indexes, который менеджер
+    очищает при любом изменении данных.
+    """
+
+    def __init__(self, managers):
+        self.managers = managers
+
+    def items(self, source):
+        return getattr(self.managers[source], QUERY_SOURCES[source]['items'])
+
+    def index(self, source, kind, name):
+        manager = self.managers[source]
+        key = (kind, name)
+        if key not in manager.indexes:
+            attribute, field_kind = QUERY_SOURCES[source]['fields'][name]
+            if kind == 'hash':
+                index = {}
+                for item in self.items(source):
+                    index.setdefault(getattr(item, attribute), []).append(item)
+            else:
+                entries = [(_field_value(item, attribute, field_kind), item) for item in self.items(source)]
+                entries = sorted((entry for entry in entries if entry[0] is not None), key=operator.itemgetter(0))
+                index = ([value for value, _ in entries], [item for _, item in entries])
+            manager.indexes[key] = index
+        return manager.indexes[key]
+
+    def plan(self, query):
+        spec = QUERY_SOURCES[query.source]
+        manager = self.managers[query.source]
+        plans = []
+        partitioned = isinstance(manager, PartitionedFinanceManager)
+        date_bounded = partitioned and any(name in spec['sorted_indexes'] for name, _, _, _ in query.conditions)
+
+        for name, op, value, raw in query.conditions:
+            if op == '=' and name in spec['hash_indexes']:
+                # Новый индекс по разделенным финансам читает все месяцы, поэтому строится,
+                # только если отсечь разделы по дате нельзя. Запись по id ищется по заголовкам разделов.
+                if partitioned and ('hash', name) not in manager.indexes:
+                    if name == 'id':
+                        plans.append(self.plan_record_id(query, manager, value, raw))
+                        continue
+                    if date_bounded:
+                        continue
+                bucket = self.index(query.source, 'hash', name).get(value, [])
+                plans.append(QueryPlan(query, 'hash', f"IndexLookup {name} = {raw}", len(bucket), bucket))
+
+        for name in spec['sorted_indexes']:
+            bounds = [(op, value) for field, op, value, _ in query.conditions
+                      if field == name and op in ('=', '<', '<=', '>', '>=')]
+            if not bounds:
+                continue
+            if partitioned:
+                plans.append(self.plan_partitions(query, manager, bounds))
+                continue
+            keys, items = self.index(query.source, 'sorted', name)
+            low, high = 0, len(keys)
+            for op, value in bounds:
+                if op in ('>', '>='):
+                    low = max(low, (bisect_right if op == '>' else bisect_left)(keys, value))
+                elif op in ('<', '<='):
+                    high = min(high, (bisect_left if op == '<' else bisect_right)(keys, value))
+                else:
+                    low = max(low, bisect_left(keys, value))
+                    high = min(high, bisect_right(keys, value))
+            high = max(low, high)
+            ordered = query.order_by == name and not query.is_aggregate
+            candidates = items[low:high]
+            if ordered and query.descending:
+                candidates = candidates[::-1]
+            plans.append(QueryPlan(query, 'range', f"IndexRange {name} [{low}:{high}] из {len(keys)}",
+                                   high - low, candidates, ordered))
+
+        if plans:
+            return min(plans, key=lambda plan: plan.estimate)
+
+        if partitioned:
+            return QueryPlan(query, 'scan', f"SeqScan {query.source} ({len(manager.headers)} разделов)",
+                             sum(header["count"] for header in manager.headers.values()), manager.records)
+        items = self.items(query.source)
+        return QueryPlan(query, 'scan', f"SeqScan {query.source}", len(items), items)
+
+    def plan_partitions(self, query, manager, bounds):
+        start_ordinal = end_ordinal = None
+        for op, value in bounds:
+            if op in ('>', '>=', '='):
+                value_start = value + 1 if op == '>' else value
+                start_ordinal = value_start if start_ordinal is None else max(start_ordinal, value_start)
+            if op in ('<', '<=', '='):
+                value_end = value - 1 if op == '<' else value
+                end_ordinal = value_end if end_ordinal is None else min(end_ordinal, value_end)
+
+        keys = sorted(key for key, header in manager.headers.items()
+                      if _header_overlaps(header, start_ordinal, end_ordinal))
+        candidates = (record for key in keys for record in manager.get_partition(key))
+        return QueryPlan(query, 'partitions',
+                         f"PartitionScan {query.source} ({len(keys)} из {len(manager.headers)} разделов)",
+                         sum(manager.headers[key]["count"] for key in keys), candidates)
+
+    def plan_record_id(self, query, manager, value, raw):
+        key = manager.locate([value]).get(value)
+        candidates = [record for record in manager.partitions[key] if record.id == value] if key else []
+        return QueryPlan(query, 'hash', f"PartitionLookup {query.source} id = {raw} (раздел {key or 'не найден'})",
+                         len(candidates), candidates)
+
+    def run(self, text):
+        query = parse_query(text)
+        plan = self.plan(query)
+        columns, rows = self.execute(query, plan)
+        return columns, rows, plan
+
+    def execute(self, query, plan):
+        fields = QUERY_SOURCES[query.source]['fields']
+        conditions = [(fields[name][0], fields[name][1], QUERY_OPERATORS[op], value)
+                      for name, op, value, _ in query.conditions]
+        stop_at = query.limit if query.limit is not None and not query.is_aggregate and (
+            not query.order_by or plan.ordered) else None
+
+        matches = []
+        examined = 0
+        for item in plan.candidates:
+            if stop_at is not None and len(matches) >= stop_at:
+                break
+            examined += 1
+            for attribute, kind, compare, value in conditions:
+                item_value = _field_value(item, attribute, kind)
+                if item_value is None or not compare(item_value, value):
+                    break
+            else:
+                matches.append(item)
+        plan.rows_examined = examined
+        plan.rows_matched = len(matches)
+
+        if query.is_aggregate:
+            columns, rows = self.aggregate(query, matches)
+        else:
+            names = [name for _, name in query.select] or list(fields)
+            if query.order_by and not plan.ordered:
+                attribute, kind = fields[query.order_by]
+                key = lambda item: _sort_key(_field_value(item, attribute, kind))
+                if query.limit is not None:
+                    select = heapq.nlargest if query.descending else heapq.nsmallest
+                    matches = select(query.limit, matches, key=key)
+                else:
+                    matches.sort(key=key, reverse=query.descending)
+            if query.limit is not None:
+                matches = matches[:query.limit]
+            columns = names
+            rows = [tuple(getattr(item, fields[name][0]) for name in names) for item in matches]
+
+        plan.rows_returned = len(rows)
+        return columns, rows
+
+    def aggregate(self, query, matches):
+        fields = QUERY_SOURCES[query.source]['fields']
+        select = query.select or [('count', None)]
+        if query.group_by and ('field', query.group_by) not in select:
+            select = [('field', query.group_by)] + select
+
+        groups = {}
+        group_attribute = fields[query.group_by][0] if query.group_by else None
+        for item in matches:
+            key = getattr(item, group_attribute) if group_attribute else None
+            groups.setdefault(key, []).append(item)
+        if not query.group_by and not groups:
+            groups[None] = []
+
+        rows = []
+        for key, items in groups.items():
+            row = []
+            for kind, name in select:
+                if kind == 'field':
+                    row.append(key)
+                    continue
+                if kind == 'count':
+                    row.append(len(items))
+                    continue
+
+                attribute, field_kind = fields[name]
+                values = [value for value in (_field_value(item, attribute, field_kind) for item in items)
+                          if value is not None]
+                if kind == 'sum':
+                    result = sum(values)
+                elif kind == 'avg':
+                    result = sum(values) / len(values) if values else None
+                elif kind == 'min':
+                    result = min(values, default=None)
+                else:
+                    result = max(values, default=None)
+                row.append(_display_value(result, field_kind))
+            rows.append(tuple(row))
+
+        columns = [_column_name(item) for item in select]
+        if query.order_by:
+            position = columns.index(query.order_by)
+            rows.sort(key=lambda row: _sort_key(row[position]), reverse=query.descending)
+        if query.limit is not None:
+            rows = rows[:query.limit]
+        return columns, rows
+
+
+# Менеджеры создаются заново при каждом входе в меню, а история одного хранилища живет всю сессию,
+# чтобы отмена и контрольные точки не терялись после возврата в главное меню.
+_session_histories = {}
+
+
+def session_history(store):
+    return _session_histories.setdefault(store, History())
+
+
+def create_note_manager():
+    return NoteManager(journal=ChangeJournal('notes_changes.jsonl'), history=session_history('notes'))
+
+
+def create_task_manager(scheduler=None):
+    return TaskManager(scheduler=scheduler, journal=ChangeJournal('tasks_changes.jsonl'),
+                       history=session_history('tasks'))
+
+
+def create_contact_manager():
+    return ContactManager(journal=ChangeJournal('contacts_changes.jsonl'), history=session_history('contacts'))
+
+
+def create_finance_manager():
+    return PartitionedFinanceManager(journal=ChangeJournal('finance_changes.jsonl'),
+                                     history=session_history('finance'))
+
+
 def main_menu():
     while True:
         print("Добро пожаловать в Персональный помощник!")
@@ -415,7 +2267,9 @@ def main_menu():
         print("3. Управление контактами")
         print("4. Управление финансовыми записями")
         print("5. Калькулятор")
-        print("6. Выход")
+        print("6. Запросы")
+        print("7. Синхронизация")
+        print("8. Выход")
 
         choice = input("Введите номер действия: ")
 
@@ -430,14 +2284,22 @@ def main_menu():
         elif choice == '5':
             calculator()
         elif choice == '6':
+            manage_queries()
+        elif choice == '7':
+            manage_sync()
+        elif choice == '8':
             print("Выход из приложения...")
             break
         else:
-            print("Некорректный ввод. Пожалуйста, выберите номер от 1 до 6.")
+            print("Некорректный ввод. Пожалуйста, выберите номер от 1 до 8.")
 
 
 def manage_notes():
-    note_manager = NoteManager()
+    try:
+        note_manager = create_note_manager()
+    except SchemaError as e:
+        print(e)
+        return
 
     while True:
         print("\nУправление заметками:")
@@ -448,7 +2310,8 @@ def manage_notes():
         print("5. Удалить заметку")
         print("6. Импортировать заметки")
         print("7. Экспортировать заметки")
-        print("8. Вернуться в главное меню")
+        print("8. История изменений")
+        print("9. Вернуться в главное меню")
 
         choice = input("Введите номер действия: ")
 
@@ -498,14 +2361,23 @@ def manage_notes():
             note_manager.export_notes(export_file)
 
         elif choice == '8':
+            manage_history(note_manager)
+
+        elif choice == '9':
             break
 
         else:
-            print("Некорректный ввод. Пожалуйста, выберите номер от 1 до 8.")
+            print("Некорректный ввод. Пожалуйста, выберите номер от 1 до 9.")
 
 
 def manage_tasks():
-    task_manager = TaskManager()
+    scheduler = ReminderScheduler()
+    try:
+        task_manager = create_task_manager(scheduler)
+    except SchemaError as e:
+        print(e)
+        return
+    scheduler.start()
 
     while True:
         print("\nУправление задачами:")
@@ -517,7 +2389,9 @@ def manage_tasks():
         print("6. Импортировать задачи")
         print("7. Экспортировать задачи")
         print("8. Фильтровать задачи")
-        print("9. Вернуться в главное меню")
+        print("9. Ближайшие сроки")
+        print("10. История изменений")
+        print("11. Вернуться в главное меню")
 
         choice = input("Введите номер действия: ")
 
@@ -594,14 +2468,25 @@ def manage_tasks():
             task_manager.filter_tasks(status=status_filter, priority=priority_filter)
 
         elif choice == '9':
+            task_manager.view_upcoming()
+
+        elif choice == '10':
+            manage_history(task_manager)
+
+        elif choice == '11':
+            scheduler.stop()
             break
 
         else:
-            print("Некорректный ввод. Пожалуйста, выберите номер от 1 до 9.")
+            print("Некорректный ввод. Пожалуйста, выберите номер от 1 до 11.")
 
 
 def manage_contacts():
-    contact_manager = ContactManager()
+    try:
+        contact_manager = create_contact_manager()
+    except SchemaError as e:
+        print(e)
+        return
 
     while True:
         print("\nУправление контактами:")
@@ -611,7 +2496,8 @@ def manage_contacts():
         print("4. Удалить контакт")
         print("5. Импортировать контакты")
         print("6. Экспортировать контакты")
-        print("7. Вернуться в главное меню")
+        print("7. История изменений")
+        print("8. Вернуться в главное меню")
 
         choice = input("Введите номер действия: ")
 
@@ -655,14 +2541,21 @@ def manage_contacts():
             contact_manager.export_contacts(export_file)
 
         elif choice == '7':
+            manage_history(contact_manager)
+
+        elif choice == '8':
             break
 
         else:
-            print("Некорректный ввод. Пожалуйста, выберите номер от 1 до 7.")
+            print("Некорректный ввод. Пожалуйста, выберите номер от 1 до 8.")
 
 
 def manage_finances():
-    finance_manager = FinanceManager()
+    try:
+        finance_manager = create_finance_manager()
+    except SchemaError as e:
+        print(e)
+        return
 
     while True:
         print("\nУправление финансовыми записями:")
@@ -672,7 +2565,8 @@ def manage_finances():
         print("4. Генерировать отчет")
         print("5. Импортировать записи")
         print("6. Экспортировать записи")
-        print("7. Вернуться в главное меню")
+        print("7. История изменений")
+        print("8. Вернуться в главное меню")
 
         choice = input("Введите номер действия: ")
 
@@ -745,10 +2639,145 @@ def manage_finances():
             finance_manager.export_records(export_file)
 
         elif choice == '7':
+            manage_history(finance_manager)
+
+        elif choice == '8':
+            break
+
+        else:
+            print("Некорректный ввод. Пожалуйста, выберите номер от 1 до 8.")
+
+
+def manage_history(manager):
+    history = manager.history
+
+    while True:
+        print("\nИстория изменений:")
+        print("1. Отменить последнее действие")
+        print("2. Повторить отмененное действие")
+        print("3. Создать контрольную точку")
+        print("4. Вернуться к контрольной точке")
+        print("5. Показать контрольные точки")
+        print("6. Назад")
+
+        choice = input("Введите номер действия: ")
+
+        if choice == '1':
+            history.undo(manager)
+
+        elif choice == '2':
+            history.redo(manager)
+
+        elif choice == '3':
+            name = input("Введите название контрольной точки: ").strip()
+            if name:
+                history.checkpoint(name)
+            else:
+                print("Ошибка: название не может быть пустым")
+
+        elif choice == '4':
+            name = input("Введите название контрольной точки: ").strip()
+            history.restore(manager, name)
+
+        elif choice == '5':
+            if not history.checkpoints:
+                print("Контрольных точек нет.")
+            for name, version in history.checkpoints.items():
+                print(f"{name} (версия {version}, текущая {history.version})")
+
+        elif choice == '6':
             break
 
         else:
-            print("Некорректный ввод. Пожалуйста, выберите номер от 1 до 7.")
+            print("Некорректный ввод. Пожалуйста, выберите номер от 1 до 6.")
+
+
+def manage_queries():
+    try:
+        engine = QueryEngine({
+            'notes': create_note_manager(),
+            'tasks': create_task_manager(),
+            'contacts': create_contact_manager(),
+            'finance': create_finance_manager()
+        })
+    except SchemaError as e:
+        print(e)
+        return
+
+    print("\nЗапросы к данным (notes, tasks, contacts, finance). Примеры:")
+    print("  tasks where priority = 'Высокий' and due < 01-01-2027 order by due limit 50")
+    print("  finance select category, count, sum(amount) group by category")
+    print("Добавьте explain перед запросом, чтобы увидеть план. Пустая строка - возврат в главное меню.")
+
+    while True:
+        text = input("Запрос: ").strip()
+        if not text:
+            break
+
+        explain = text.lower().startswith('explain ')
+        if explain:
+            text = text[len('explain '):]
+
+        try:
+            columns, rows, plan = engine.run(text)
+        except QueryError as e:
+            print(f"Ошибка запроса: {e}")
+            continue
+
+        if explain:
+            print("\n".join(plan.describe()))
+            continue
+
+        if not rows:
+            print("Нет записей по заданным критериям.")
+        for row in rows:
+            print(" | ".join(f"{column}: {value}" for column, value in zip(columns, row)))
+
+
+def manage_sync():
+    managers = {
+        '1': create_note_manager,
+        '2': create_task_manager,
+        '3': create_contact_manager,
+        '4': create_finance_manager
+    }
+
+    while True:
+        print("\nСинхронизация:")
+        print("1. Экспортировать изменения")
+        print("2. Применить изменения")
+        print("3. Вернуться в главное меню")
+
+        choice = input("Введите номер действия: ")
+
+        if choice == '3':
+            break
+
+        if choice not in ['1', '2']:
+            print("Некорректный ввод. Пожалуйста, выберите номер от 1 до 3.")
+            continue
+
+        store = input("Выберите данные (1 - заметки, 2 - задачи, 3 - контакты, 4 - финансы): ")
+        if store not in managers:
+            print("Некорректный ввод. Пожалуйста, выберите номер от 1 до 4.")
+            continue
+        try:
+            manager = managers[store]()
+        except SchemaError as e:
+            print(e)
+            continue
+
+        if choice == '1':
+            since = input("Введите номер, после которого нужны изменения (или оставьте пустым для всех): ")
+            if since and not since.isdigit():
+                print("Ошибка: введен неверный номер")
+                continue
+            export_file = input("Введите имя файла для экспорта изменений (например changes.json): ")
+            manager.export_changes(export_file, int(since or 0))
+
+        else:
+            import_file = input("Введите имя файла с изменениями: ")
+            manager.apply_changes(import_file)
 
 
 def calculator():
@@ -0,0 +1,79 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from personal_assistant import FinanceRecord, PartitionedFinanceManager, QueryEngine, TaskManager
+
+# Проверки запускаются через pytest или просто: python tests/test_queries.py
+
+
+def make_finance(directory):
+    manager = PartitionedFinanceManager(os.path.join(directory, 'finance'), os.path.join(directory, 'finance.json'))
+    manager.add_records([FinanceRecord(i + 1, i, f"c{i % 3}", f"{1 + i % 28:02d}-{1 + i // 100:02d}-2024")
+                         for i in range(1200)])
+    # Новый менеджер читает только заголовки разделов, как при запуске программы.
+    return PartitionedFinanceManager(os.path.join(directory, 'finance'), os.path.join(directory, 'finance.json'))
+
+
+def make_tasks(directory):
+    manager = TaskManager(os.path.join(directory, 'tasks.json'))
+    for i in range(30):
+        manager.add_task(f"Задача {i}", priority=('Высокий', 'Низкий')[i % 2], due_date=f"{1 + i:02d}-01-2027")
+    return manager
+
+
+def test_tasks_use_hash_and_range_indexes():
+    with tempfile.TemporaryDirectory() as directory:
+        engine = QueryEngine({'tasks': make_tasks(directory)})
+
+        _, rows, plan = engine.run("tasks select id where id = 7")
+        assert plan.access == 'hash' and rows == [(7,)]
+
+        _, rows, plan = engine.run("tasks select id where due >= 10-01-2027 and due < 13-01-2027 order by due")
+        assert plan.access == 'range' and plan.ordered and rows == [(10,), (11,), (12,)]
+        assert plan.rows_examined == 3
+
+        _, rows, plan = engine.run("tasks select id where title contains '2'")
+        assert plan.access == 'scan' and plan.rows_examined == 30
+
+
+def test_finance_date_bound_prunes_partitions():
+    with tempfile.TemporaryDirectory() as directory:
+        manager = make_finance(directory)
+        engine = QueryEngine({'finance': manager})
+
+        _, rows, plan = engine.run("finance where category = 'c1' and date >= 01-11-2024")
+        assert plan.access == 'partitions'
+        assert "2 из 12 разделов" in "\n".join(plan.describe())
+        assert len(rows) == 67
+        assert sorted(manager.partitions) == ['2024-11', '2024-12']
+        assert ('hash', 'category') not in manager.indexes
+
+
+def test_finance_id_lookup_reads_one_partition():
+    with tempfile.TemporaryDirectory() as directory:
+        manager = make_finance(directory)
+        engine = QueryEngine({'finance': manager})
+
+        _, rows, plan = engine.run("finance select id where id = 1150")
+        assert plan.access == 'hash' and rows == [(1150,)]
+        assert list(manager.partitions) == ['2024-12']
+
+
+def test_group_by_orders_by_implicit_count():
+    with tempfile.TemporaryDirectory() as directory:
+        engine = QueryEngine({'tasks': make_tasks(directory)})
+        engine.managers['tasks'].add_task('Еще одна', priority='Высокий')
+
+        columns, rows, _ = engine.run("tasks group by priority order by count desc")
+        assert columns == ['priority', 'count']
+        assert rows == [('Высокий', 16), ('Низкий', 15)]
+
+
+if __name__ == "__main__":
+    for name, check in list(globals().items()):
+        if name.startswith('test_'):
+            check()
+            print(f"OK {name}")
@@ -0,0 +1,172 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from personal_assistant import ChangeJournal, FinanceRecord, History, PartitionedFinanceManager, TaskManager
+
+# Проверки запускаются через pytest или просто: python tests/test_sync_history.py
+
+
+def make_task_manager(directory):
+    return TaskManager(os.path.join(directory, 'tasks.json'),
+                       journal=ChangeJournal(os.path.join(directory, 'tasks_changes.jsonl')))
+
+
+def sync(source, target, directory):
+    delta_file = os.path.join(directory, 'delta.json')
+    source.export_changes(delta_file)
+    target.apply_changes(delta_file)
+
+
+def titles(manager):
+    return sorted((task.id, task.title) for task in manager.tasks)
+
+
+def test_sync_keeps_rows_after_delete():
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, 'a'))
+        os.makedirs(os.path.join(directory, 'b'))
+        a = make_task_manager(os.path.join(directory, 'a'))
+        for title in ('x', 'y', 'z'):
+            a.add_task(title)
+        a.delete_task(2)
+        a.add_task('w')
+
+        b = make_task_manager(os.path.join(directory, 'b'))
+        sync(a, b, directory)
+        assert titles(a) == [(1, 'x'), (3, 'z'), (4, 'w')]
+        assert titles(b) == titles(a)
+
+
+def test_sync_does_not_echo_applied_changes():
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, 'a'))
+        os.makedirs(os.path.join(directory, 'b'))
+        a = make_task_manager(os.path.join(directory, 'a'))
+        b = make_task_manager(os.path.join(directory, 'b'))
+        a.add_task('x-v1')
+        a.edit_task(1, title='x-v2')
+        sync(a, b, directory)
+
+        a.edit_task(1, title='x-v3')
+        sync(b, a, directory)
+        assert titles(a) == [(1, 'x-v3')]
+
+        sync(a, b, directory)
+        assert titles(b) == [(1, 'x-v3')]
+
+
+def test_sync_both_ways_keeps_rows_added_on_each_copy():
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, 'a'))
+        os.makedirs(os.path.join(directory, 'b'))
+        a = make_task_manager(os.path.join(directory, 'a'))
+        b = make_task_manager(os.path.join(directory, 'b'))
+        a.add_task('shared')
+        sync(a, b, directory)
+        sync(b, a, directory)
+
+        a.add_task('only-on-a')
+        b.add_task('only-on-b')
+        sync(a, b, directory)
+        sync(b, a, directory)
+        expected = ['only-on-a', 'only-on-b', 'shared']
+        assert sorted(task.title for task in a.tasks) == expected
+        assert sorted(task.title for task in b.tasks) == expected
+
+        # Копии могли выдать строкам разные id, но правка должна попасть в ту же запись.
+        only_on_b = next(task.id for task in a.tasks if task.title == 'only-on-b')
+        a.edit_task(only_on_b, title='edited-on-a')
+        sync(a, b, directory)
+        assert sorted(task.title for task in b.tasks) == ['edited-on-a', 'only-on-a', 'shared']
+
+
+def test_apply_changes_rejects_files_that_are_not_deltas():
+    with tempfile.TemporaryDirectory() as directory:
+        manager = make_task_manager(directory)
+        manager.add_task('a')
+        export_file = os.path.join(directory, 'export.json')
+        broken_file = os.path.join(directory, 'broken.json')
+        manager.export_tasks(export_file)
+        with open(broken_file, 'w', encoding='utf-8') as file:
+            file.write('{"store_id": ')
+
+        manager.apply_changes(export_file)
+        manager.apply_changes(broken_file)
+        assert titles(manager) == [(1, 'a')]
+
+
+def test_partitioned_update_moves_record_between_months():
+    with tempfile.TemporaryDirectory() as directory:
+        finance_directory = os.path.join(directory, 'finance')
+        manager = PartitionedFinanceManager(finance_directory, os.path.join(directory, 'finance.json'))
+        manager.add_record(10, 'Еда', '05-01-2024')
+        manager.apply_batch([{"op": 'update', "item": FinanceRecord(1, 15, 'Еда', '09-03-2024')}])
+
+        reloaded = PartitionedFinanceManager(finance_directory, os.path.join(directory, 'finance.json'))
+        assert [(record.id, record.date) for record in reloaded.records] == [(1, '09-03-2024')]
+
+
+def test_history_delete_undo_redo_restore():
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'tasks.json')
+        manager = TaskManager(filename, history=History())
+        history = manager.history
+        manager.add_task('x')
+        manager.add_task('y')
+        history.checkpoint('start')
+
+        manager.delete_task(1)
+        assert titles(manager) == [(2, 'y')]
+        assert history.undo(manager)
+        assert titles(manager) == [(1, 'x'), (2, 'y')]
+        assert history.redo(manager)
+        assert titles(manager) == [(2, 'y')]
+
+        assert history.restore(manager, 'start')
+        assert titles(manager) == [(1, 'x'), (2, 'y')]
+        assert titles(TaskManager(filename)) == [(1, 'x'), (2, 'y')]
+
+
+def test_history_after_reimporting_own_export():
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'tasks.json')
+        export_file = os.path.join(directory, 'export.json')
+        manager = TaskManager(filename, history=History())
+        history = manager.history
+        manager.add_task('a')
+        manager.add_task('b')
+        history.checkpoint('before import')
+        manager.export_tasks(export_file)
+        manager.import_tasks(export_file)
+        assert titles(manager) == [(1, 'a'), (2, 'b'), (3, 'a'), (4, 'b')]
+
+        assert history.undo(manager)
+        assert history.redo(manager)
+        assert history.undo(manager)
+        assert titles(TaskManager(filename)) == [(1, 'a'), (2, 'b')]
+
+        assert history.redo(manager)
+        assert history.restore(manager, 'before import')
+        assert titles(TaskManager(filename)) == [(1, 'a'), (2, 'b')]
+
+
+def test_undo_delete_keeps_order():
+    with tempfile.TemporaryDirectory() as directory:
+        manager = TaskManager(os.path.join(directory, 'tasks.json'), history=History())
+        for title in ('a', 'b', 'c'):
+            manager.add_task(title)
+        manager.delete_task(2)
+        manager.delete_task(1)
+        assert manager.history.undo(manager)
+        assert manager.history.undo(manager)
+        assert [task.title for task in manager.tasks] == ['a', 'b', 'c']
+
+
+if __name__ == "__main__":
+    for name, check in list(globals().items()):
+        if name.startswith('test_'):
+            check()
+            print(f"OK {name}")